@@ -0,0 +1,93 @@
+`timescale 1ns / 1ns
+
+/*
+ * Camera frame generator for the testbench
+ *
+ * While en is high, plays one frame in the timing the DUT decodes:
+ * a VSYNC pulse, then `rows` lines of `cols` pixels with HREF high,
+ * each followed by a short horizontal blank. Pixels alternate between
+ * pix_even and pix_odd by column. frame_done rises after the last
+ * line and holds until en is dropped, which also rearms the generator.
+ */
+
+module pixel_gen (
+    input  wire       clk,
+    input  wire       en,
+    input  wire [7:0] rows,        // Lines per frame
+    input  wire [7:0] cols,        // Pixels per line
+    input  wire [7:0] pix_even,    // Pixel driven on even columns
+    input  wire [7:0] pix_odd,     // Pixel driven on odd columns
+    output wire [7:0] pixel,
+    output reg        vsync,
+    output reg        href,
+    output reg        frame_done
+);
+
+    localparam [2:0] VSYNC_CYCLES  = 3'd5;  // Frame sync pulse width
+    localparam [2:0] HBLANK_CYCLES = 3'd3;  // HREF low between lines
+
+    localparam [2:0] S_IDLE  = 3'd0;
+    localparam [2:0] S_VSYNC = 3'd1;
+    localparam [2:0] S_LINE  = 3'd2;
+    localparam [2:0] S_BLANK = 3'd3;
+    localparam [2:0] S_DONE  = 3'd4;
+
+    reg [2:0] state;
+    reg [2:0] count;
+    reg [7:0] row;
+    reg [7:0] col;
+
+    assign pixel = col[0] ? pix_odd : pix_even;
+
+    always @(posedge clk) begin
+        if (!en) begin
+            state      <= S_IDLE;
+            vsync      <= 1'b0;
+            href       <= 1'b0;
+            frame_done <= 1'b0;
+            row        <= 8'd0;
+            col        <= 8'd0;
+        end else begin
+            case (state)
+                S_IDLE: begin
+                    vsync <= 1'b1;
+                    count <= VSYNC_CYCLES - 3'd1;
+                    state <= S_VSYNC;
+                end
+                S_VSYNC: begin
+                    if (count == 3'd0) begin
+                        vsync <= 1'b0;
+                        href  <= 1'b1;
+                        state <= S_LINE;
+                    end else begin
+                        count <= count - 3'd1;
+                    end
+                end
+                S_LINE: begin
+                    if (col == cols - 8'd1) begin
+                        href  <= 1'b0;
+                        count <= HBLANK_CYCLES - 3'd1;
+                        state <= S_BLANK;
+                    end else begin
+                        col <= col + 8'd1;
+                    end
+                end
+                S_BLANK: begin
+                    if (count != 3'd0) begin
+                        count <= count - 3'd1;
+                    end else if (row == rows - 8'd1) begin
+                        frame_done <= 1'b1;
+                        state      <= S_DONE;
+                    end else begin
+                        row   <= row + 8'd1;
+                        col   <= 8'd0;
+                        href  <= 1'b1;
+                        state <= S_LINE;
+                    end
+                end
+                default: ;  // S_DONE: hold until en drops
+            endcase
+        end
+    end
+
+endmodule
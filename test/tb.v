@@ -1,4 +1,4 @@
-`timescale 1ns / 1ps
+`timescale 1ns / 1ns
 
 module tb;
     // Signals
@@ -10,22 +10,69 @@ module tb;
     wire [7:0] uo_out;
     wire [7:0] uio_out;
     wire [7:0] uio_oe;
+
+    // Frame generator: while frame_gen_en is set, pixel_gen drives ui_in,
+    // VSYNC and HREF, so a test only waits for frame_done
+    reg        frame_gen_en;
+    reg  [7:0] frame_rows;
+    reg  [7:0] frame_cols;
+    reg  [7:0] pix_even;
+    reg  [7:0] pix_odd;
+    wire [7:0] gen_pixel;
+    wire       gen_vsync;
+    wire       gen_href;
+    wire       frame_done;
+
+    wire [7:0] dut_ui_in  = frame_gen_en ? gen_pixel : ui_in;
+    wire [7:0] dut_uio_in = frame_gen_en ? {uio_in[7], gen_vsync, gen_href, uio_in[4:0]}
+                                         : uio_in;
+
+    initial begin
+        frame_gen_en = 1'b0;
+        frame_rows   = 8'd0;
+        frame_cols   = 8'd0;
+        pix_even     = 8'd0;
+        pix_odd      = 8'd0;
+    end
+
+    pixel_gen frame_gen (
+        .clk(clk),
+        .en(frame_gen_en),
+        .rows(frame_rows),
+        .cols(frame_cols),
+        .pix_even(pix_even),
+        .pix_odd(pix_odd),
+        .pixel(gen_pixel),
+        .vsync(gen_vsync),
+        .href(gen_href),
+        .frame_done(frame_done)
+    );
     
     // DUT instantiation
     tt_um_precision_farming dut (
-        .ui_in(ui_in),
+        .ui_in(dut_ui_in),
         .uo_out(uo_out),
-        .uio_in(uio_in),
+        .uio_in(dut_uio_in),
         .uio_out(uio_out),
         .uio_oe(uio_oe),
         .ena(ena),
         .clk(clk),
         .rst_n(rst_n)
     );
+
+    // Clock generation: kept in HDL so cocotb doesn't pay a VPI round-trip
+    // on every edge
+`ifndef CLOCK_PERIOD_NS
+`define CLOCK_PERIOD_NS 2   // Must be even: half a period is a whole ns
+`endif
+    initial clk = 1'b0;
+    always #(`CLOCK_PERIOD_NS / 2) clk = ~clk;
     
-    // Dump waves
+    // Dump waves (disabled with -DNO_VCD, see VCD in the Makefile)
+`ifndef NO_VCD
     initial begin
         $dumpfile("tb.vcd");
         $dumpvars(0, tb);
     end
+`endif
 endmodule
@@ -1,14 +1,16 @@
 # SPDX-FileCopyrightText: © 2024 Tiny Tapeout
 # SPDX-License-Identifier: MIT
 
+import os
+
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, FallingEdge, ReadOnly, RisingEdge, Timer, with_timeout
 
 # ============================================
 # TEST CONFIGURATION
 # ============================================
-CLOCK_PERIOD_NS = 40  # 25MHz
+# Generated in tb.v; the Makefile passes the same period to both sides
+CLOCK_PERIOD_NS = int(os.environ.get("CLOCK_PERIOD_NS", "2"))
 
 MODE_SENSOR = 0
 MODE_ML = 1
@@ -18,6 +20,26 @@ SENSOR_HUMIDITY = 1
 SENSOR_LIGHT = 2
 SENSOR_TEMP = 3
 
+# uio_in control bits
+_MODE_BIT = 0x80
+_SENSOR_MASK = 0x03
+_MODE_BITS = (0x00, _MODE_BIT)  # Indexed by MODE_SENSOR / MODE_ML
+
+# Cycles spent feeding the 4-sample average through ui_in (4 x 10 cycles)
+BASELINE_CYCLES = 4 * 10
+
+# pixel_gen.v frame timing, used to bound the wait for a frame to end
+_FRAME_VSYNC_CYCLES = 5
+_FRAME_HBLANK_CYCLES = 3
+_FRAME_MARGIN_CYCLES = 10
+
+# Register name stem of each sensor's averaging registers in project.v,
+# indexed by uio_in[1:0] as the RTL decodes it
+_BASELINE_REGS = ("soil", "temp", "humid", "light")
+
+# Shadow of the last value driven onto uio_in, so helpers never read it back
+_uio_state = 0
+
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
@@ -27,41 +49,119 @@ async def reset_dut(dut):
     dut._log.info("Applying reset")
     dut.ena.value = 1
     dut.ui_in.value = 0
-    dut.uio_in.value = 0
+    write_uio(dut, 0)
+    dut.frame_gen_en.value = 0
     dut.rst_n.value = 0
     await ClockCycles(dut.clk, 10)
     dut.rst_n.value = 1
     await ClockCycles(dut.clk, 5)
     dut._log.info("Reset released")
 
+async def settle(cycles):
+    """Let the design run for a number of clock cycles in a single trigger"""
+    await Timer(cycles * CLOCK_PERIOD_NS, units="ns")
+
+def write_uio(dut, value):
+    """Drive uio_in and remember the value in the shadow register"""
+    global _uio_state
+    _uio_state = value & 0xFF
+    dut.uio_in.value = _uio_state
+
 def set_mode(dut, mode):
     """Set operation mode (0=sensor, 1=ML)"""
-    current_val = int(dut.uio_in.value)
-    if mode == MODE_ML:
-        dut.uio_in.value = current_val | 0x80
-    else:
-        dut.uio_in.value = current_val & 0x7F
+    write_uio(dut, (_uio_state & ~_MODE_BIT) | _MODE_BITS[mode])
 
 def select_sensor(dut, sensor_id):
     """Select which sensor to read (0-3)"""
-    current_val = int(dut.uio_in.value) & 0xFC
-    dut.uio_in.value = current_val | (sensor_id & 0x03)
-
-def get_alert_status(dut):
-    """Read alert and status outputs"""
-    try:
-        uo_val = int(dut.uo_out.value)
-    except ValueError:
-        # Handle 'x' or 'z' values by treating as 0
-        uo_val = 0
-    
-    return {
-        'system_alert': bool(uo_val & 0x80),
-        'ready': bool(uo_val & 0x40),
-        'mode': bool(uo_val & 0x20),
-        'prediction': bool(uo_val & 0x10),
-        'status_bits': (uo_val >> 1) & 0x07,
-    }
+    write_uio(dut, (_uio_state & ~_SENSOR_MASK) | (sensor_id & _SENSOR_MASK))
+
+def preload_baseline(dut, sensor_id, value):
+    """Backdoor-load a settled 4-sample average of value for a sensor
+
+    Returns False when the averaging registers aren't visible (gate-level
+    netlist), in which case the caller must feed real samples instead.
+    """
+    name = _BASELINE_REGS[sensor_id & _SENSOR_MASK]
+    core = dut.dut
+    if not hasattr(core, f"{name}_sum"):
+        return False
+    
+    history = getattr(core, f"{name}_history")
+    for i in range(4):
+        history[i].value = value
+    getattr(core, f"{name}_sum").value = 4 * value
+    getattr(core, f"sensor_{name}").value = value
+    return True
+
+async def load_baseline(dut, sensor_id, value):
+    """Settle a 4-sample average of value for a sensor and hold ui_in at value
+
+    Preloads the averaging registers through the backdoor, or feeds real
+    samples for BASELINE_CYCLES when they aren't visible.
+    """
+    dut.ui_in.value = value
+    if not preload_baseline(dut, sensor_id, value):
+        await settle(BASELINE_CYCLES)
+
+async def drive_frame(dut, rows, cols, even_px, odd_px):
+    """Play one camera frame through tb.v's pixel_gen and wait for it to end
+
+    The generator pulses VSYNC, then sends rows lines of cols pixels with
+    HREF high, alternating even_px / odd_px by column. Fails the test if
+    frame_done doesn't rise within the frame's length plus a small margin.
+    """
+    if not (0 < rows <= 0xFF and 0 < cols <= 0xFF):
+        raise ValueError(f"frame must be 1-255 rows by 1-255 cols, got {rows} x {cols}")
+    
+    frame_cycles = (_FRAME_VSYNC_CYCLES + rows * (cols + _FRAME_HBLANK_CYCLES)
+                    + _FRAME_MARGIN_CYCLES)
+    dut.frame_rows.value = rows
+    dut.frame_cols.value = cols
+    dut.pix_even.value = even_px
+    dut.pix_odd.value = odd_px
+    dut.frame_gen_en.value = 1
+    await with_timeout(RisingEdge(dut.frame_done), frame_cycles * CLOCK_PERIOD_NS, "ns")
+    dut.frame_gen_en.value = 0
+
+class AlertStatus:
+    """Alert and status outputs, decoded on demand from a single uo_out read"""
+    __slots__ = ("_value",)
+    
+    def __init__(self, dut):
+        try:
+            self._value = int(dut.uo_out.value)
+        except ValueError:
+            # Handle 'x' or 'z' values by treating as 0
+            self._value = 0
+    
+    @property
+    def system_alert(self):
+        return bool(self._value & 0x80)
+    
+    @property
+    def ready(self):
+        return bool(self._value & 0x40)
+    
+    @property
+    def mode(self):
+        return bool(self._value & 0x20)
+    
+    @property
+    def prediction(self):
+        return bool(self._value & 0x10)
+    
+    @property
+    def status_bits(self):
+        return (self._value >> 1) & 0x07
+
+async def read_status(dut):
+    """Read the alert status once the current time step has settled
+
+    Inputs can't be driven again until the test leaves the read-only
+    phase, e.g. by awaiting the next falling edge.
+    """
+    await ReadOnly()
+    return AlertStatus(dut)
 
 # ============================================
 # TESTS
@@ -72,14 +172,11 @@ async def test_reset(dut):
     """Test basic reset functionality"""
     dut._log.info("TEST: Reset Functionality")
     
-    clock = Clock(dut.clk, CLOCK_PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
-    
     await reset_dut(dut)
     
     # After reset, design should be in a known state
     # System ready should eventually be high
-    await ClockCycles(dut.clk, 10)
+    await settle(10)
     
     dut._log.info("✓ Reset test passed")
 
@@ -88,25 +185,20 @@ async def test_sensor_baseline(dut):
     """Test sensor mode baseline establishment"""
     dut._log.info("TEST: Sensor Baseline Learning")
     
-    clock = Clock(dut.clk, CLOCK_PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
-    
     await reset_dut(dut)
     
     set_mode(dut, MODE_SENSOR)
     select_sensor(dut, SENSOR_SOIL)
     await ClockCycles(dut.clk, 5)
     
-    # Feed stable readings
-    for i in range(4):
-        dut.ui_in.value = 100
-        await ClockCycles(dut.clk, 10)
-    
-    await ClockCycles(dut.clk, 50)
+    # Feed stable readings, then let the average settle. This test keeps
+    # the real learning path; the others preload the average instead
+    dut.ui_in.value = 100
+    await settle(BASELINE_CYCLES + 50)
     
     # With stable baseline, should not have critical alert
-    status = get_alert_status(dut)
-    dut._log.info(f"Status after baseline: alert={status['system_alert']}")
+    status = await read_status(dut)
+    dut._log.info(f"Status after baseline: alert={status.system_alert}")
     
     # This is a soft check - baseline establishment shouldn't cause critical issues
     dut._log.info("✓ Baseline test passed")
@@ -116,9 +208,6 @@ async def test_all_sensors(dut):
     """Test all 4 sensors"""
     dut._log.info("TEST: All 4 Sensors")
     
-    clock = Clock(dut.clk, CLOCK_PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
-    
     await reset_dut(dut)
     
     test_values = [120, 150, 80, 200]
@@ -131,12 +220,8 @@ async def test_all_sensors(dut):
         select_sensor(dut, sensor_id)
         await ClockCycles(dut.clk, 5)
         
-        # Send readings
-        for i in range(4):
-            dut.ui_in.value = test_values[sensor_id]
-            await ClockCycles(dut.clk, 10)
-        
-        await ClockCycles(dut.clk, 30)
+        await load_baseline(dut, sensor_id, test_values[sensor_id])
+        await settle(30)
     
     dut._log.info("✓ All sensors test passed")
 
@@ -145,42 +230,17 @@ async def test_ml_mode(dut):
     """Test ML mode with camera frame"""
     dut._log.info("TEST: ML Mode Camera Processing")
     
-    clock = Clock(dut.clk, CLOCK_PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
-    
     await reset_dut(dut)
     
     set_mode(dut, MODE_ML)
-    await ClockCycles(dut.clk, 20)
+    await settle(20)
     
-    # VSYNC high (start frame)
-    current_val = int(dut.uio_in.value) | 0x40
-    dut.uio_in.value = current_val
-    await ClockCycles(dut.clk, 5)
+    # Send a 10 x 20 frame of green-ish pixels
+    await drive_frame(dut, 10, 20, 0b00111000, 0b00111000)
+    await settle(50)
     
-    # Send some pixel rows
-    for row in range(10):
-        # HREF high
-        current_val = int(dut.uio_in.value) | 0x20
-        dut.uio_in.value = current_val
-        
-        # Send pixels
-        for col in range(20):
-            dut.ui_in.value = 0b00111000  # Green-ish
-            await ClockCycles(dut.clk, 1)
-        
-        # HREF low
-        current_val = int(dut.uio_in.value) & ~0x20
-        dut.uio_in.value = current_val
-        await ClockCycles(dut.clk, 3)
-    
-    # VSYNC low (end frame)
-    current_val = int(dut.uio_in.value) & ~0x40
-    dut.uio_in.value = current_val
-    await ClockCycles(dut.clk, 50)
-    
-    status = get_alert_status(dut)
-    dut._log.info(f"ML Mode: harvest={status['prediction']}, alert={status['system_alert']}")
+    status = await read_status(dut)
+    dut._log.info(f"ML Mode: harvest={status.prediction}, alert={status.system_alert}")
     
     dut._log.info("✓ ML mode test passed")
 
@@ -189,28 +249,27 @@ async def test_mode_switching(dut):
     """Test switching between modes"""
     dut._log.info("TEST: Mode Switching")
     
-    clock = Clock(dut.clk, CLOCK_PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
-    
     await reset_dut(dut)
     
     # Start in sensor mode
     set_mode(dut, MODE_SENSOR)
-    await ClockCycles(dut.clk, 20)
+    await settle(20)
     
-    status = get_alert_status(dut)
-    dut._log.info(f"Sensor mode: mode_indicator={status['mode']}")
+    status = await read_status(dut)
+    dut._log.info(f"Sensor mode: mode_indicator={status.mode}")
     
     # Switch to ML mode
+    await FallingEdge(dut.clk)
     set_mode(dut, MODE_ML)
-    await ClockCycles(dut.clk, 20)
+    await settle(20)
     
-    status = get_alert_status(dut)
-    dut._log.info(f"ML mode: mode_indicator={status['mode']}")
+    status = await read_status(dut)
+    dut._log.info(f"ML mode: mode_indicator={status.mode}")
     
     # Switch back
+    await FallingEdge(dut.clk)
     set_mode(dut, MODE_SENSOR)
-    await ClockCycles(dut.clk, 20)
+    await settle(20)
     
     dut._log.info("✓ Mode switching test passed")
 
@@ -219,24 +278,17 @@ async def test_edge_cases(dut):
     """Test edge cases"""
     dut._log.info("TEST: Edge Cases")
     
-    clock = Clock(dut.clk, CLOCK_PERIOD_NS, units="ns")
-    cocotb.start_soon(clock.start())
-    
     await reset_dut(dut)
     
     set_mode(dut, MODE_SENSOR)
     select_sensor(dut, SENSOR_SOIL)
     
     # Minimum values
-    for i in range(4):
-        dut.ui_in.value = 0
-        await ClockCycles(dut.clk, 10)
-    await ClockCycles(dut.clk, 30)
+    await load_baseline(dut, SENSOR_SOIL, 0)
+    await settle(30)
     
     # Maximum values
-    for i in range(4):
-        dut.ui_in.value = 255
-        await ClockCycles(dut.clk, 10)
-    await ClockCycles(dut.clk, 30)
+    await load_baseline(dut, SENSOR_SOIL, 255)
+    await settle(30)
     
     dut._log.info("✓ Edge cases test passed")
@@ -0,0 +1,111 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: MIT
+
+"""
+Run every cocotb test in test.py in its own simulator process.
+
+    pytest -n auto test_runner.py
+
+Each test resets the DUT, so they are independent and pytest-xdist can
+spread them across cores. The RTL is built once per pytest run into a
+shared directory; the first worker to get there builds it while the
+others wait on a file lock, then every worker runs against that build.
+"""
+
+import ast
+import os
+from pathlib import Path
+
+import pytest
+from cocotb.runner import get_runner
+from filelock import FileLock
+
+# ============================================
+# RUNNER CONFIGURATION
+# ============================================
+TEST_DIR = Path(__file__).resolve().parent
+SRC_DIR = TEST_DIR.parent / "src"
+PROJECT_SOURCES = ["project.v"]
+TB_SOURCES = ["tb.v", "pixel_gen.v"]
+TOPLEVEL = "tb"
+SIM = os.environ.get("SIM", "verilator")
+VCD = os.environ.get("VCD", "0") == "1"
+
+TIMESCALE = "1ns/1ns"
+CLOCK_PERIOD_NS = os.environ.get("CLOCK_PERIOD_NS", "2")
+DEFINES = {"CLOCK_PERIOD_NS": CLOCK_PERIOD_NS}
+# As in the Makefile, cocotb's Verilator main writes the trace, not tb.v
+WAVES = VCD and SIM == "verilator"
+if not VCD or WAVES:
+    DEFINES["NO_VCD"] = 1
+LOG_LEVEL = os.environ.get("COCOTB_LOG_LEVEL", "WARNING")
+
+def cocotb_testcases():
+    """Names of the cocotb tests defined in test.py"""
+    tree = ast.parse((TEST_DIR / "test.py").read_text())
+    return [
+        node.name
+        for node in tree.body
+        if isinstance(node, ast.AsyncFunctionDef) and node.name.startswith("test_")
+    ]
+
+def build_args(build_dir):
+    """Simulator build arguments, mirroring the RTL settings in the Makefile"""
+    if SIM == "verilator":
+        return [
+            "--timescale", TIMESCALE,
+            "--timing", "-O3", "--x-assign", "fast", "--x-initial", "fast", "--noassert",
+        ]
+    if SIM == "icarus":
+        # iverilog only takes a default timescale from a command file
+        cmds = build_dir / "cmds.f"
+        cmds.parent.mkdir(parents=True, exist_ok=True)
+        cmds.write_text(f"+timescale+{TIMESCALE}\n")
+        return ["-f", str(cmds)]
+    return []
+
+@pytest.fixture(scope="session")
+def build_dir(testrun_uid):
+    """Build the RTL simulation once and share it between xdist workers"""
+    build_dir = TEST_DIR / "sim_build" / "parallel"
+    build_dir.mkdir(parents=True, exist_ok=True)
+    stamp = build_dir / "build.stamp"
+
+    with FileLock(build_dir / "build.lock"):
+        # Only the first worker of this pytest run builds
+        if not stamp.is_file() or stamp.read_text() != testrun_uid:
+            runner = get_runner(SIM)
+            runner.build(
+                verilog_sources=[SRC_DIR / src for src in PROJECT_SOURCES]
+                + [TEST_DIR / src for src in TB_SOURCES],
+                includes=[SRC_DIR],
+                defines=DEFINES,
+                build_args=build_args(build_dir),
+                hdl_toplevel=TOPLEVEL,
+                build_dir=build_dir,
+                waves=WAVES,
+                # The defines aren't part of the simulators' up-to-date check
+                always=True,
+            )
+            stamp.write_text(testrun_uid)
+    return build_dir
+
+# ============================================
+# TESTS
+# ============================================
+
+@pytest.mark.parametrize("testcase", cocotb_testcases())
+def test_cocotb(build_dir, testcase):
+    """Run a single cocotb test against the shared build"""
+    runner = get_runner(SIM)
+    runner.test(
+        hdl_toplevel=TOPLEVEL,
+        hdl_toplevel_lang="verilog",
+        test_module="test",
+        testcase=testcase,
+        build_dir=build_dir,
+        test_dir=build_dir / testcase,
+        waves=WAVES,
+        test_args=["--trace-file", "tb.vcd"] if WAVES else [],
+        extra_env={"COCOTB_LOG_LEVEL": LOG_LEVEL, "CLOCK_PERIOD_NS": CLOCK_PERIOD_NS},
+    )